@@ -0,0 +1,87 @@
+import http.client
+import json
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+
+class QueueClient:
+    """
+    Minimal HTTP client for the lease/ack protocol exposed by server.py.
+    Keeps one keep-alive connection open and transparently reconnects
+    when the server (or a proxy) drops it. ack/nack/release/heartbeat are
+    safe to resend (the server ignores jobs no longer leased to this
+    worker); lease is not. Not thread-safe: use one client per thread.
+    """
+
+    def __init__(self, base_url: str, worker: str, timeout: float = 60.0):
+        parsed = urlparse(base_url if "://" in base_url else f"http://{base_url}")
+        self.worker = worker
+        self._scheme = parsed.scheme
+        self._host = parsed.hostname or "127.0.0.1"
+        self._port = parsed.port
+        self._prefix = parsed.path.rstrip("/")
+        self._timeout = timeout
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            self._conn = cls(self._host, self._port, timeout=self._timeout)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _post(self, path: str, payload: Dict[str, Any], idempotent: bool = True) -> Dict[str, Any]:
+        body = json.dumps({"worker": self.worker, **payload})
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        # Retry once on a fresh connection if the pooled one went stale. Only for
+        # calls the server can safely see twice: the first may have been applied.
+        for attempt in range(2 if idempotent else 1):
+            conn = self._connection()
+            try:
+                conn.request("POST", self._prefix + path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.HTTPException, ConnectionError, OSError):
+                self.close()
+                if attempt == 1 or not idempotent:
+                    raise
+                continue
+            if resp.will_close:
+                self.close()
+            result = json.loads(data or b"{}")
+            if resp.status >= 400:
+                raise RuntimeError(f"{path} failed ({resp.status}): {result.get('error', result)}")
+            return result
+        return {}
+
+    def lease(self, limit: int = 1, wait: float = 0, lease_seconds: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Lease up to `limit` jobs, long-polling up to `wait` seconds when the queue is empty.
+        Never resent: a lost response would leave a second set of jobs leased but undelivered.
+        """
+        payload: Dict[str, Any] = {"limit": limit, "wait": wait}
+        if lease_seconds is not None:
+            payload["lease_seconds"] = lease_seconds
+        return self._post("/lease", payload, idempotent=False).get("jobs", [])
+
+    def ack(self, job_ids: List[str], usage: Optional[Dict[str, Dict[str, Any]]] = None) -> int:
+        payload: Dict[str, Any] = {"job_ids": job_ids}
+        if usage:
+            payload["usage"] = usage
+        return int(self._post("/ack", payload).get("acked", 0))
+
+    def nack(self, failures: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        return self._post("/nack", {"jobs": failures}).get("results", {})
+
+    def release(self, job_ids: List[str]) -> int:
+        return int(self._post("/release", {"job_ids": job_ids}).get("released", 0))
+
+    def heartbeat(self, job_ids: List[str], lease_seconds: Optional[int] = None) -> int:
+        payload: Dict[str, Any] = {"job_ids": job_ids}
+        if lease_seconds is not None:
+            payload["lease_seconds"] = lease_seconds
+        return int(self._post("/heartbeat", payload).get("extended", 0))
@@ -1,7 +1,19 @@
-from job_queue import list_dlq as _list_dlq, retry_dlq_job as _retry
+from job_queue import (
+    list_dlq as _list_dlq, retry_dlq_job as _retry, retry_dlq_jobs as _retry_many,
+    purge_dlq as _purge, export_dlq as _export
+)
 
 def list_dlq():
     _list_dlq()
 
 def retry_dlq_job(job_id: str):
     _retry(job_id) 
+
+def retry_dlq_jobs(**filters) -> int:
+    return _retry_many(**filters)
+
+def purge_dlq(**filters) -> int:
+    return _purge(**filters)
+
+def export_dlq(out, **filters) -> int:
+    return _export(out, **filters)
@@ -1,7 +1,9 @@
+import json
 import os
+import random
 import sqlite3 
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from utils import ensure_data_dir, utcnow_iso, pretty_print_table
 
 DB_PATH = os.path.join(ensure_data_dir(), "queue.db")
@@ -14,6 +16,48 @@ def _connect():
     return conn
 
 
+# Optional per-job limits accepted by enqueue_job and applied to the child process
+JOB_LIMIT_COLUMNS = [
+    ("timeout", "INTEGER"),          # wall-clock seconds before the job is killed
+    ("cpu_limit", "INTEGER"),        # RLIMIT_CPU, CPU seconds
+    ("memory_limit_mb", "INTEGER"),  # RLIMIT_AS, address space in MB
+    ("max_open_files", "INTEGER"),   # RLIMIT_NOFILE
+]
+
+# Resource usage from wait4(), accumulated across attempts (max_rss_kb is the peak,
+# NULL when no attempt was long-lived enough to measure, and left out of averages)
+JOB_USAGE_COLUMNS = [
+    ("wall_time", "REAL"),
+    ("cpu_user", "REAL"),
+    ("cpu_sys", "REAL"),
+    ("max_rss_kb", "INTEGER"),
+]
+
+
+# Job settings copied into the DLQ so a requeued job comes back as it was enqueued
+DLQ_CARRIED_COLUMNS = [
+    ("priority", "INTEGER"),
+    ("max_retries", "INTEGER"),
+]
+
+
+def _iso_precise(dt: datetime) -> str:
+    """
+    Microsecond ISO timestamp for next_run_at, so jittered/staggered retries
+    don't collapse onto whole seconds. Compared against _iso_precise(now);
+    a whole-second value ('...:05Z') sorts after every '...:05.xxxxxxZ', so
+    at worst it becomes due up to a second late.
+    """
+    return dt.isoformat(timespec="microseconds") + "Z"
+
+
+def _ensure_column(cur, table: str, column: str, decl: str):
+    """Add a column to an existing table if it is missing (lightweight migration)."""
+    cols = {r["name"] for r in cur.execute(f"PRAGMA table_info({table})").fetchall()}
+    if column not in cols:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
 def init_db():
     """Initialize SQLite tables for jobs, DLQ, and config."""
     conn = _connect()
@@ -31,11 +75,21 @@ def init_db():
         priority INTEGER DEFAULT 0
     )
     """)
+    # Lease columns for remote workers (added to pre-existing databases too)
+    _ensure_column(cur, "jobs", "leased_by", "TEXT")
+    _ensure_column(cur, "jobs", "lease_expires_at", "TEXT")
+    # Per-job execution limits (NULL = no limit) and measured resource usage
+    for column, decl in JOB_LIMIT_COLUMNS + JOB_USAGE_COLUMNS:
+        _ensure_column(cur, "jobs", column, decl)
     cur.execute("""
     CREATE INDEX IF NOT EXISTS idx_jobs_state_next
       ON jobs(state, next_run_at)
     """)
     cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_jobs_state_lease
+      ON jobs(state, lease_expires_at)
+    """)
+    cur.execute("""
     CREATE TABLE IF NOT EXISTS dlq (
         id TEXT PRIMARY KEY,
         command TEXT NOT NULL,
@@ -43,6 +97,9 @@ def init_db():
         created_at TEXT NOT NULL
     )
     """)
+    # Dead-lettered jobs keep their settings, limits and measured usage (for requeue and metrics)
+    for column, decl in DLQ_CARRIED_COLUMNS + JOB_LIMIT_COLUMNS + JOB_USAGE_COLUMNS:
+        _ensure_column(cur, "dlq", column, decl)
     cur.execute("""
     CREATE TABLE IF NOT EXISTS config (
         key TEXT PRIMARY KEY,
@@ -50,7 +107,8 @@ def init_db():
     )
     """)
     # Default configuration
-    for k, v in [("max_retries", "3"), ("backoff_base", "2"), ("stop", "0")]:
+    for k, v in [("max_retries", "3"), ("backoff_base", "2"), ("stop", "0"), ("lease_seconds", "30"),
+                 ("job_timeout", "10"), ("backoff_jitter", "0.5"), ("backoff_max", "3600")]:
         cur.execute("INSERT OR IGNORE INTO config(key, value) VALUES (?, ?)", (k, v))
     conn.commit()
 
@@ -88,15 +146,14 @@ def enqueue_job(payload: Dict[str, Any]):
         payload["max_retries"] = int(get_config_value("max_retries") or 3)
 
     # ✅ Handle 'run_at' for delayed or scheduled jobs
-    run_at = now
+    run_at = _iso_precise(datetime.utcnow())
     if "run_at" in payload:
         val = str(payload["run_at"]).strip()
         if val.lower().startswith("in "):
             # e.g. "in 5" means in 5 minutes
             try:
                 minutes = int(val.split(" ")[1])
-                run_at_dt = datetime.utcnow() + timedelta(minutes=minutes)
-                run_at = run_at_dt.replace(microsecond=0).isoformat() + "Z"
+                run_at = _iso_precise(datetime.utcnow() + timedelta(minutes=minutes))
             except Exception:
                 raise ValueError("Invalid 'run_at' format (expected 'in <minutes>' or ISO timestamp)")
         else:
@@ -105,6 +162,18 @@ def enqueue_job(payload: Dict[str, Any]):
     # ✅ Handle priority (default 0)
     priority = int(payload.get("priority", 0))
 
+    # ✅ Per-job timeout (defaults to config job_timeout) and optional resource limits
+    if "timeout" not in payload:
+        payload["timeout"] = int(get_config_value("job_timeout") or 10)
+    limits = []
+    for key, _ in JOB_LIMIT_COLUMNS:
+        val = payload.get(key)
+        if val is not None:
+            val = int(val)
+            if val <= 0:
+                raise ValueError(f"'{key}' must be a positive integer")
+        limits.append(val)
+
     row = (
         payload["id"],
         payload["command"],
@@ -115,13 +184,15 @@ def enqueue_job(payload: Dict[str, Any]):
         now,
         run_at,
         priority,
+        *limits,
     )
 
     conn = _connect()
     try:
         conn.execute("""
-        INSERT INTO jobs(id, command, state, attempts, max_retries, created_at, updated_at, next_run_at, priority)
-        VALUES(?,?,?,?,?,?,?,?,?)
+        INSERT INTO jobs(id, command, state, attempts, max_retries, created_at, updated_at, next_run_at, priority,
+                         timeout, cpu_limit, memory_limit_mb, max_open_files)
+        VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)
         """, row)
     except sqlite3.IntegrityError:
         raise ValueError(f"Job with id '{payload['id']}' already exists.")
@@ -154,31 +225,77 @@ def show_status():
 
 
 def _compute_next_backoff(attempts: int) -> str:
-    """Exponential backoff for retry scheduling."""
+    """
+    Exponential backoff for retry scheduling, capped at backoff_max seconds.
+    backoff_jitter (0..1) randomly shortens each delay by up to that fraction,
+    so jobs that failed together don't all come back at the same moment.
+    """
     base = int(get_config_value("backoff_base") or 2)
-    delay_seconds = base ** max(1, attempts)  # 2^1, 2^2, etc.
-    next_time = datetime.utcnow() + timedelta(seconds=delay_seconds)
-    return next_time.replace(microsecond=0).isoformat() + "Z"
+    cap = float(get_config_value("backoff_max") or 3600)
+    jitter = min(1.0, max(0.0, float(get_config_value("backoff_jitter") or 0.5)))
+    delay_seconds = min(cap, base ** max(1, attempts))  # 2^1, 2^2, etc.
+    delay_seconds *= 1 - jitter * random.random()
+    return _iso_precise(datetime.utcnow() + timedelta(seconds=delay_seconds))
+
+
+def _release_expired_leases(cur, now: str):
+    """
+    Jobs whose remote lease ran out (worker died, hung or lost contact) count
+    as a failed attempt: back to 'pending' with backoff, or to the DLQ once
+    retries are exhausted, same as fail_job.
+    """
+    expired = cur.execute("""
+        SELECT * FROM jobs
+        WHERE state='processing' AND lease_expires_at IS NOT NULL AND lease_expires_at < ?
+    """, (now,)).fetchall()
+    for job in expired:
+        _record_failure(cur, job, "Lease expired")
+
+
+def _has_claimable(conn, due: str, now: str) -> bool:
+    """Cheap read-only check so idle pollers don't take the write lock for nothing."""
+    row = conn.execute("""
+        SELECT EXISTS(SELECT 1 FROM jobs WHERE state='pending' AND next_run_at <= ?)
+            OR EXISTS(SELECT 1 FROM jobs WHERE state='processing'
+                      AND lease_expires_at IS NOT NULL AND lease_expires_at < ?) AS ready
+    """, (due, now)).fetchone()
+    return bool(row["ready"])
+
+
+LEASE_MAX_SECONDS = 3600
+
+
+def _lease_expiry(lease_seconds: Optional[int]) -> str:
+    if lease_seconds is None:
+        lease_seconds = int(get_config_value("lease_seconds") or 30)
+    # A lease of <= 0 would be expired on arrival and handed to another worker
+    lease_seconds = min(max(1, int(lease_seconds)), LEASE_MAX_SECONDS)
+    expires = datetime.utcnow() + timedelta(seconds=lease_seconds)
+    return expires.replace(microsecond=0).isoformat() + "Z"
 
 
 def claim_next_job() -> Optional[sqlite3.Row]:
     """
     Atomically claim the next runnable job:
     - Must be 'pending'
-    - Must be due (next_run_at <= now)
+    - Must be due (next_run_at <= now, at microsecond precision)
     - Pick highest priority first, then oldest
     """
     conn = _connect()
     cur = conn.cursor()
     now = utcnow_iso()
+    due = _iso_precise(datetime.utcnow())
+    if not _has_claimable(conn, due, now):
+        return None
 
     cur.execute("BEGIN IMMEDIATE")  # Lock queue
+    _release_expired_leases(cur, now)
     row = cur.execute("""
         SELECT id FROM jobs
         WHERE state='pending' AND next_run_at <= ?
         ORDER BY priority DESC, created_at ASC
         LIMIT 1
-    """, (now,)).fetchone()
+    """, (due,)).fetchone()
     if not row:
         cur.execute("COMMIT")
         return None
@@ -203,32 +320,274 @@ def mark_completed(job_id: str):
     conn = _connect()
     conn.execute("""
         UPDATE jobs
-        SET state='completed', updated_at=?
+        SET state='completed', updated_at=?, leased_by=NULL, lease_expires_at=NULL
         WHERE id=?
     """, (utcnow_iso(), job_id))
 
 
-def mark_retry(job_id: str, attempts: int):
-    """Schedule job retry with exponential backoff."""
-    conn = _connect()
-    next_run = _compute_next_backoff(attempts)
-    conn.execute("""
+def _mark_retry(cur, job_id: str, attempts: int):
+    cur.execute("""
         UPDATE jobs
-        SET state='pending', attempts=?, next_run_at=?, updated_at=?
+        SET state='pending', attempts=?, next_run_at=?, updated_at=?,
+            leased_by=NULL, lease_expires_at=NULL
         WHERE id=?
-    """, (attempts, next_run, utcnow_iso(), job_id))
+    """, (attempts, _compute_next_backoff(attempts), utcnow_iso(), job_id))
+
+
+def _move_to_dlq(cur, job_id: str, command: str, reason: str):
+    carried = ", ".join(c for c, _ in DLQ_CARRIED_COLUMNS + JOB_LIMIT_COLUMNS + JOB_USAGE_COLUMNS)
+    # Microsecond created_at lets retry_dlq_jobs take an exact snapshot
+    created_at = _iso_precise(datetime.utcnow())
+    moved = cur.execute(f"""
+        INSERT OR REPLACE INTO dlq(id, command, reason, created_at, {carried})
+        SELECT id, ?, ?, ?, {carried} FROM jobs WHERE id=?
+    """, (command, reason, created_at, job_id))
+    if moved.rowcount == 0:
+        cur.execute("""
+            INSERT OR REPLACE INTO dlq(id, command, reason, created_at)
+            VALUES(?,?,?,?)
+        """, (job_id, command, reason, created_at))
+    cur.execute("DELETE FROM jobs WHERE id=?", (job_id,))
+
+
+def _record_failure(cur, job, reason: str) -> str:
+    """Count a failed attempt: retry with backoff, or DLQ once retries are exhausted."""
+    attempts = int(job["attempts"]) + 1
+    if attempts > int(job["max_retries"]):
+        _move_to_dlq(cur, job["id"], job["command"], f"{reason}, retries exhausted")
+        return "dead"
+    _mark_retry(cur, job["id"], attempts)
+    return "retry"
+
+
+def mark_retry(job_id: str, attempts: int):
+    """Schedule job retry with exponential backoff."""
+    _mark_retry(_connect(), job_id, attempts)
 
 
 def move_to_dlq(job_id: str, command: str, reason: str):
     """Move permanently failed job to DLQ."""
+    _move_to_dlq(_connect(), job_id, command, reason)
+
+
+def record_usage(job_id: str, usage: Optional[Dict[str, Any]], worker: Optional[str] = None):
+    """Add one attempt's measured resource usage to the job's running totals."""
+    _record_usage(_connect(), job_id, usage, worker)
+
+
+def _record_usage(cur, job_id: str, usage: Optional[Dict[str, Any]], worker: Optional[str] = None):
+    # Only rows still processing (and leased to `worker`) take usage, so a
+    # resent ack/nack for an already-settled job doesn't count it twice.
+    if not usage:
+        return
+    params = (
+        float(usage.get("wall_time") or 0),
+        float(usage.get("cpu_user") or 0),
+        float(usage.get("cpu_sys") or 0),
+        usage.get("max_rss_kb"),
+        usage.get("max_rss_kb"),
+        job_id,
+    )
+    owner = "" if worker is None else " AND leased_by=?"
+    cur.execute(f"""
+        UPDATE jobs
+        SET wall_time=COALESCE(wall_time, 0) + ?,
+            cpu_user=COALESCE(cpu_user, 0) + ?,
+            cpu_sys=COALESCE(cpu_sys, 0) + ?,
+            max_rss_kb=CASE WHEN ? IS NULL THEN max_rss_kb
+                            ELSE MAX(COALESCE(max_rss_kb, 0), CAST(? AS INTEGER)) END
+        WHERE id=? AND state='processing'{owner}
+    """, params if worker is None else (*params, worker))
+
+
+def resource_summary(top: int = 5) -> Dict[str, Any]:
+    """Aggregate measured job cost (live and dead-lettered jobs) for capacity planning."""
     conn = _connect()
-    conn.execute("""
-        INSERT OR REPLACE INTO dlq(id, command, reason, created_at)
-        VALUES(?,?,?,?)
-    """, (job_id, command, reason, utcnow_iso()))
-    conn.execute("DELETE FROM jobs WHERE id=?", (job_id,))
+    measured = """
+        SELECT id, state, wall_time, cpu_user, cpu_sys, max_rss_kb FROM jobs WHERE wall_time IS NOT NULL
+        UNION ALL
+        SELECT id, 'dead', wall_time, cpu_user, cpu_sys, max_rss_kb FROM dlq WHERE wall_time IS NOT NULL
+    """
+    agg = conn.execute(f"""
+        SELECT COUNT(*) AS measured,
+               COALESCE(SUM(wall_time), 0) AS wall,
+               COALESCE(SUM(cpu_user), 0) AS usr,
+               COALESCE(SUM(cpu_sys), 0) AS sys,
+               COALESCE(MAX(max_rss_kb), 0) AS rss,
+               COALESCE(AVG(max_rss_kb), 0) AS avg_rss
+        FROM ({measured})
+    """).fetchone()
+    heaviest = conn.execute(f"""
+        SELECT id, state, cpu_user + cpu_sys AS cpu_seconds, wall_time, max_rss_kb
+        FROM ({measured})
+        ORDER BY cpu_seconds DESC, max_rss_kb DESC
+        LIMIT ?
+    """, (top,)).fetchall()
+    measured = agg["measured"]
+    cpu_total = agg["usr"] + agg["sys"]
+    return {
+        "measured_jobs": measured,
+        "total_wall_seconds": round(agg["wall"], 3),
+        "total_cpu_user_seconds": round(agg["usr"], 3),
+        "total_cpu_sys_seconds": round(agg["sys"], 3),
+        "avg_wall_seconds": round(agg["wall"] / measured, 3) if measured else 0.0,
+        "avg_cpu_seconds": round(cpu_total / measured, 3) if measured else 0.0,
+        "avg_max_rss_kb": int(agg["avg_rss"]),  # AVG skips jobs with no measured peak
+        "peak_max_rss_kb": agg["rss"],
+        "top_cpu_jobs": [
+            {**dict(r), "cpu_seconds": round(r["cpu_seconds"], 3)} for r in heaviest
+        ],
+    }
+
+
+def fail_job(job_id: str, reason: str, worker: Optional[str] = None) -> Optional[str]:
+    """
+    Record a failed attempt: schedule a retry with backoff, or move the job
+    to the DLQ once retries are exhausted. Returns 'retry', 'dead', or None
+    if the job is not currently processing (or leased by someone else).
+    """
+    conn = _connect()
+    if worker is None:
+        job = conn.execute(
+            "SELECT * FROM jobs WHERE id=? AND state='processing'", (job_id,)
+        ).fetchone()
+    else:
+        job = conn.execute(
+            "SELECT * FROM jobs WHERE id=? AND state='processing' AND leased_by=?", (job_id, worker)
+        ).fetchone()
+    if not job:
+        return None
+    return _record_failure(conn, job, reason)
+
+
+# ------------------ Remote Leases ------------------
+
+def lease_jobs(worker: str, limit: int = 1, lease_seconds: Optional[int] = None) -> List[sqlite3.Row]:
+    """
+    Atomically lease up to `limit` runnable jobs to a remote worker.
+    Leased jobs are 'processing' until acked/nacked or the lease expires.
+    """
+    conn = _connect()
+    cur = conn.cursor()
+    now = utcnow_iso()
+    due = _iso_precise(datetime.utcnow())
+    expires = _lease_expiry(lease_seconds)
+    if not _has_claimable(conn, due, now):
+        return []
+
+    cur.execute("BEGIN IMMEDIATE")  # Lock queue
+    _release_expired_leases(cur, now)
+    rows = cur.execute("""
+        SELECT id FROM jobs
+        WHERE state='pending' AND next_run_at <= ?
+        ORDER BY priority DESC, created_at ASC
+        LIMIT ?
+    """, (due, max(1, int(limit)))).fetchall()
+    if not rows:
+        cur.execute("COMMIT")
+        return []
+
+    ids = [r["id"] for r in rows]
+    marks = ",".join("?" * len(ids))
+    cur.execute(f"""
+        UPDATE jobs
+        SET state='processing', leased_by=?, lease_expires_at=?, updated_at=?
+        WHERE id IN ({marks}) AND state='pending'
+    """, (worker, expires, now, *ids))
+    jobs = cur.execute(f"""
+        SELECT * FROM jobs
+        WHERE id IN ({marks}) AND leased_by=?
+        ORDER BY priority DESC, created_at ASC
+    """, (*ids, worker)).fetchall()
+    cur.execute("COMMIT")
+    return jobs
+
+
+def ack_jobs(worker: str, job_ids: List[str], usage: Optional[Dict[str, Dict[str, Any]]] = None) -> int:
+    """
+    Mark jobs leased by `worker` as completed, recording any reported usage,
+    in one transaction. Returns the number acked (0 for a resent ack).
+    """
+    if not job_ids:
+        return 0
+    conn = _connect()
+    cur = conn.cursor()
+    marks = ",".join("?" * len(job_ids))
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        for job_id in job_ids:
+            _record_usage(cur, job_id, (usage or {}).get(job_id), worker)
+        acked = cur.execute(f"""
+            UPDATE jobs
+            SET state='completed', updated_at=?, leased_by=NULL, lease_expires_at=NULL
+            WHERE id IN ({marks}) AND state='processing' AND leased_by=?
+        """, (utcnow_iso(), *job_ids, worker)).rowcount
+    except Exception:
+        cur.execute("ROLLBACK")
+        raise
+    cur.execute("COMMIT")
+    return acked
 
 
+def nack_jobs(worker: str, failures: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+    """
+    Record failed attempts (and their usage) for jobs leased by `worker`, in
+    one transaction. Returns {job_id: 'retry'|'dead'|None}; None means the
+    job is no longer held by this worker (e.g. a resent nack).
+    """
+    results: Dict[str, Optional[str]] = {}
+    if not failures:
+        return results
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        for f in failures:
+            job = cur.execute(
+                "SELECT * FROM jobs WHERE id=? AND state='processing' AND leased_by=?", (f["id"], worker)
+            ).fetchone()
+            if not job:
+                results[f["id"]] = None
+                continue
+            _record_usage(cur, f["id"], f.get("usage"), worker)
+            results[f["id"]] = _record_failure(cur, job, f.get("reason") or "Failed on remote worker")
+    except Exception:
+        cur.execute("ROLLBACK")
+        raise
+    cur.execute("COMMIT")
+    return results
+
+
+def release_jobs(worker: str, job_ids: List[str]) -> int:
+    """Hand unstarted leased jobs back to 'pending' without counting an attempt."""
+    if not job_ids:
+        return 0
+    conn = _connect()
+    marks = ",".join("?" * len(job_ids))
+    cur = conn.execute(f"""
+        UPDATE jobs
+        SET state='pending', updated_at=?, leased_by=NULL, lease_expires_at=NULL
+        WHERE id IN ({marks}) AND state='processing' AND leased_by=?
+    """, (utcnow_iso(), *job_ids, worker))
+    return cur.rowcount
+
+
+def heartbeat_jobs(worker: str, job_ids: List[str], lease_seconds: Optional[int] = None) -> int:
+    """Extend the lease on jobs still held by `worker`. Returns the number extended."""
+    if not job_ids:
+        return 0
+    conn = _connect()
+    marks = ",".join("?" * len(job_ids))
+    cur = conn.execute(f"""
+        UPDATE jobs
+        SET lease_expires_at=?, updated_at=?
+        WHERE id IN ({marks}) AND state='processing' AND leased_by=?
+    """, (_lease_expiry(lease_seconds), utcnow_iso(), *job_ids, worker))
+    return cur.rowcount
+
+
+# ------------------ DLQ ------------------
+
 def list_dlq():
     """List all jobs in Dead Letter Queue."""
     conn = _connect()
@@ -236,23 +595,151 @@ def list_dlq():
     pretty_print_table(rows)
 
 
-def retry_dlq_job(job_id: str):
-    """Move a job back from DLQ to main queue for reprocessing."""
-    conn = _connect()
-    row = conn.execute("SELECT * FROM dlq WHERE id=?", (job_id,)).fetchone()
-    if not row:
-        raise ValueError(f"DLQ job '{job_id}' not found")
-
+def _dlq_filter(reason: Optional[str] = None, since: Optional[str] = None,
+                until: Optional[str] = None, id_pattern: Optional[str] = None):
+    """Build a WHERE clause selecting DLQ entries by reason substring, created_at range and id glob."""
+    clauses, params = [], []
+    if reason:
+        # Literal substring: escape LIKE wildcards so '_' or '%' in the text can't widen a purge
+        escaped = reason.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("reason LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+    if since:
+        clauses.append("created_at >= ?")
+        params.append(since)
+    if until:
+        clauses.append("created_at <= ?")
+        params.append(until)
+    if id_pattern:
+        clauses.append("id GLOB ?")  # shell-style: job_*, batch-?
+        params.append(id_pattern)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _check_chunking(chunk_size: int, rate: Optional[float] = None):
+    # LIMIT 0 would do nothing and LIMIT -1 is one unbounded transaction
+    if int(chunk_size) < 1:
+        raise ValueError("'chunk_size' must be at least 1")
+    if rate is not None and float(rate) <= 0:
+        raise ValueError("'rate' must be greater than 0")
+
+
+def _requeue_dlq_rows(cur, rows, start: datetime, rate: Optional[float], offset: int):
+    """
+    Insert DLQ rows back into jobs with their original priority, max_retries,
+    limits and accumulated usage, and delete them from the DLQ (caller holds
+    the transaction). Entries dead-lettered before these were kept fall back
+    to the config defaults.
+    """
     now = utcnow_iso()
-    conn.execute("""
-        INSERT INTO jobs(id, command, state, attempts, max_retries, created_at, updated_at, next_run_at, priority)
-        VALUES(?,?,?,?,?,?,?,?,0)
+    default_retries = int(get_config_value("max_retries") or 3)
+    default_timeout = int(get_config_value("job_timeout") or 10)
+    extra = [c for c, _ in JOB_LIMIT_COLUMNS + JOB_USAGE_COLUMNS]
+    params = []
+    for i, row in enumerate(rows):
+        if rate:
+            # Spread releases out: job n becomes runnable n/rate seconds after start
+            run_at = _iso_precise(start + timedelta(seconds=(offset + i) / rate))
+        else:
+            run_at = _iso_precise(datetime.utcnow())
+        values = {c: row[c] for c in extra}
+        values["timeout"] = values["timeout"] or default_timeout
+        max_retries = row["max_retries"] if row["max_retries"] is not None else default_retries
+        params.append((row["id"], row["command"], "pending", 0, max_retries, now, now, run_at,
+                       row["priority"] or 0, *values.values()))
+    cols = ", ".join(extra)
+    marks = ",".join("?" * (9 + len(extra)))
+    updates = ",\n          ".join(f"{c}=excluded.{c}" for c in ["max_retries", "priority"] + extra)
+    cur.executemany(f"""
+        INSERT INTO jobs(id, command, state, attempts, max_retries, created_at, updated_at, next_run_at, priority,
+                         {cols})
+        VALUES({marks})
         ON CONFLICT(id) DO UPDATE SET
           command=excluded.command,
           state='pending',
           attempts=0,
           updated_at=excluded.updated_at,
-          next_run_at=excluded.next_run_at
-    """, (row["id"], row["command"], "pending", 0,
-          int(get_config_value("max_retries") or 3), now, now, now))
-    conn.execute("DELETE FROM dlq WHERE id=?", (job_id,))
+          next_run_at=excluded.next_run_at,
+          leased_by=NULL,
+          lease_expires_at=NULL,
+          {updates}
+    """, params)
+    cur.executemany("DELETE FROM dlq WHERE id=?", [(row["id"],) for row in rows])
+
+
+def retry_dlq_job(job_id: str):
+    """Move a job back from DLQ to main queue for reprocessing."""
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    row = cur.execute("SELECT * FROM dlq WHERE id=?", (job_id,)).fetchone()
+    if not row:
+        cur.execute("ROLLBACK")
+        raise ValueError(f"DLQ job '{job_id}' not found")
+    _requeue_dlq_rows(cur, [row], datetime.utcnow(), None, 0)
+    cur.execute("COMMIT")
+
+
+def retry_dlq_jobs(reason: Optional[str] = None, since: Optional[str] = None,
+                   until: Optional[str] = None, id_pattern: Optional[str] = None,
+                   chunk_size: int = 500, rate: Optional[float] = None) -> int:
+    """
+    Requeue every DLQ entry matching the filters, `chunk_size` rows per
+    transaction so workers aren't locked out for the whole run. With `rate`
+    (jobs/second) the requeued jobs' next_run_at is staggered instead of
+    releasing them all at once. Returns the number requeued.
+    """
+    _check_chunking(chunk_size, rate)
+    where, params = _dlq_filter(reason, since, until, id_pattern)
+    conn = _connect()
+    cur = conn.cursor()
+    start = datetime.utcnow()
+    # Snapshot: only entries dead-lettered before this run started, so a job requeued
+    # here that fails straight back into the DLQ isn't picked up again.
+    where = f"{where} AND created_at <= ?" if where else " WHERE created_at <= ?"
+    params = [*params, _iso_precise(start)]
+    moved = 0
+    while True:
+        cur.execute("BEGIN IMMEDIATE")
+        rows = cur.execute(
+            f"SELECT * FROM dlq{where} ORDER BY created_at, id LIMIT ?", (*params, chunk_size)
+        ).fetchall()
+        if not rows:
+            cur.execute("COMMIT")
+            return moved
+        try:
+            _requeue_dlq_rows(cur, rows, start, rate, moved)
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        cur.execute("COMMIT")
+        moved += len(rows)
+
+
+def purge_dlq(reason: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, id_pattern: Optional[str] = None,
+              chunk_size: int = 500) -> int:
+    """Delete DLQ entries matching the filters in chunked transactions. Returns the number deleted."""
+    _check_chunking(chunk_size)
+    where, params = _dlq_filter(reason, since, until, id_pattern)
+    conn = _connect()
+    deleted = 0
+    while True:
+        cur = conn.execute(
+            f"DELETE FROM dlq WHERE id IN (SELECT id FROM dlq{where} LIMIT ?)", (*params, chunk_size)
+        )
+        if cur.rowcount <= 0:
+            return deleted
+        deleted += cur.rowcount
+
+
+def export_dlq(out, reason: Optional[str] = None, since: Optional[str] = None,
+               until: Optional[str] = None, id_pattern: Optional[str] = None) -> int:
+    """Write DLQ entries matching the filters to `out` as JSON lines. Returns the number written."""
+    where, params = _dlq_filter(reason, since, until, id_pattern)
+    conn = _connect()
+    count = 0
+    for row in conn.execute(f"SELECT * FROM dlq{where} ORDER BY created_at, id", params):
+        out.write(json.dumps(dict(row)) + "\n")
+        count += 1
+    return count
@@ -5,7 +5,7 @@ from job_queue import (
     init_db, enqueue_job, list_jobs, show_status,
     set_config, get_config_value
 )
-from dlq import list_dlq, retry_dlq_job
+from dlq import list_dlq, retry_dlq_job, retry_dlq_jobs, purge_dlq, export_dlq
 from worker import start_workers, stop_workers
 
 
@@ -40,11 +40,20 @@ def worker_group():
 
 @worker_group.command("start")
 @click.option("--count", default=1, show_default=True, type=int, help="Number of worker processes")
-def worker_start(count):
-    """Start worker processes. Ctrl+C to stop, or use `queuectl worker stop`."""
-    # Clear stop flag before starting
-    set_config("stop", "0")
-    start_workers(count)
+@click.option("--remote", default=None, metavar="URL",
+              help="Lease jobs from a queuectl server (e.g. http://host:8080) instead of the local DB")
+@click.option("--batch", default=1, show_default=True, type=int,
+              help="Jobs to lease per request in --remote mode")
+def worker_start(count, remote, batch):
+    """Start worker processes. Ctrl+C to stop, or use `queuectl worker stop`.
+
+    Example (on another host):
+      queuectl worker start --count 4 --remote http://queue-host:8080 --batch 5
+    """
+    if not remote:
+        # Clear stop flag before starting
+        set_config("stop", "0")
+    start_workers(count, remote=remote, batch=batch)
 
 
 @worker_group.command("stop")
@@ -91,6 +100,61 @@ def dlq_retry_cmd(job_id):
     retry_dlq_job(job_id)
 
 
+def _dlq_filter_options(fn):
+    """Shared --reason/--since/--until/--id-pattern filters for bulk DLQ commands."""
+    fn = click.option("--id-pattern", default=None, help="Shell-style glob on job id, e.g. 'batch_*'")(fn)
+    fn = click.option("--until", default=None, help="Only entries moved to DLQ at/before this ISO timestamp")(fn)
+    fn = click.option("--since", default=None, help="Only entries moved to DLQ at/after this ISO timestamp")(fn)
+    fn = click.option("--reason", default=None, help="Only entries whose reason contains this text")(fn)
+    return fn
+
+
+def _dlq_filters(reason, since, until, id_pattern, all_):
+    filters = {"reason": reason, "since": since, "until": until, "id_pattern": id_pattern}
+    if not all_ and not any(filters.values()):
+        raise click.UsageError("Give at least one filter, or --all to match every DLQ entry.")
+    return filters
+
+
+@dlq_group.command("retry-bulk")
+@_dlq_filter_options
+@click.option("--all", "all_", is_flag=True, help="Match every DLQ entry")
+@click.option("--chunk-size", default=500, show_default=True, type=click.IntRange(min=1),
+              help="Entries per transaction")
+@click.option("--rate", default=None, type=click.FloatRange(min=0, min_open=True),
+              help="Release at most this many jobs/second (staggers next_run_at)")
+def dlq_retry_bulk_cmd(reason, since, until, id_pattern, all_, chunk_size, rate):
+    """Requeue all DLQ jobs matching the filters.
+
+    Example:
+      queuectl dlq retry-bulk --reason Timeout --since 2025-11-11T00:00:00Z --rate 50
+    """
+    filters = _dlq_filters(reason, since, until, id_pattern, all_)
+    moved = retry_dlq_jobs(chunk_size=chunk_size, rate=rate, **filters)
+    click.echo(f"Requeued {moved} DLQ job(s).")
+
+
+@dlq_group.command("purge")
+@_dlq_filter_options
+@click.option("--all", "all_", is_flag=True, help="Match every DLQ entry")
+@click.option("--chunk-size", default=500, show_default=True, type=click.IntRange(min=1),
+              help="Entries per transaction")
+def dlq_purge_cmd(reason, since, until, id_pattern, all_, chunk_size):
+    """Permanently delete DLQ jobs matching the filters."""
+    filters = _dlq_filters(reason, since, until, id_pattern, all_)
+    deleted = purge_dlq(chunk_size=chunk_size, **filters)
+    click.echo(f"Purged {deleted} DLQ job(s).")
+
+
+@dlq_group.command("export")
+@_dlq_filter_options
+@click.option("--output", "-o", default="-", type=click.File("w"), help="File to write (default: stdout)")
+def dlq_export_cmd(reason, since, until, id_pattern, output):
+    """Export DLQ jobs matching the filters as JSON lines."""
+    count = export_dlq(output, reason=reason, since=since, until=until, id_pattern=id_pattern)
+    click.echo(f"Exported {count} DLQ job(s).", err=True)
+
+
 # ---------- Config ----------
 @cli.group("config")
 def config_group():
@@ -107,6 +171,8 @@ def config_set_cmd(key, value):
     Examples:
       queuectl config set max_retries 3
       queuectl config set backoff_base 2
+      queuectl config set backoff_max 3600
+      queuectl config set backoff_jitter 0.5
     """
     set_config(key, value)
     click.echo(f"Config set: {key} = {value}")
@@ -1,7 +1,13 @@
-from flask import Flask, request, jsonify
-from job_queue import enqueue_job, list_jobs, show_status, list_dlq, retry_dlq_job, get_config_value, set_config
+from flask import Flask, Response, request, jsonify
+from job_queue import (
+    enqueue_job, list_jobs, show_status, list_dlq, retry_dlq_job, get_config_value, set_config,
+    lease_jobs, ack_jobs, nack_jobs, heartbeat_jobs, release_jobs, resource_summary,
+    retry_dlq_jobs, purge_dlq, export_dlq, LEASE_MAX_SECONDS
+)
+import io
 from worker import start_workers, stop_workers
 import threading
+import time
 
 app = Flask(__name__) 
  
@@ -61,6 +67,53 @@ def retry_dlq(job_id):
         return jsonify({"status": "error", "error": str(e)}), 400
 
 
+def _dlq_filters(data):
+    return {k: data.get(k) for k in ("reason", "since", "until", "id_pattern")}
+
+
+def _dlq_bulk_request():
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    filters = _dlq_filters(data)
+    if not data.get("all") and not any(filters.values()):
+        raise ValueError("Give at least one filter, or \"all\": true")
+    return data, filters
+
+
+@app.route("/dlq/retry", methods=["POST"])
+def retry_dlq_bulk():
+    """Requeue DLQ jobs matching {reason, since, until, id_pattern}; optional chunk_size and rate."""
+    try:
+        data, filters = _dlq_bulk_request()
+        rate = data.get("rate")
+        moved = retry_dlq_jobs(chunk_size=int(data.get("chunk_size", 500)),
+                               rate=float(rate) if rate is not None else None, **filters)
+        return jsonify({"status": "success", "requeued": moved}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
+
+
+@app.route("/dlq/purge", methods=["POST"])
+def purge_dlq_bulk():
+    try:
+        data, filters = _dlq_bulk_request()
+        deleted = purge_dlq(chunk_size=int(data.get("chunk_size", 500)), **filters)
+        return jsonify({"status": "success", "purged": deleted}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
+
+
+@app.route("/dlq/export", methods=["GET"])
+def export_dlq_bulk():
+    """Export DLQ jobs matching query-string filters as JSON lines."""
+    buf = io.StringIO()
+    export_dlq(buf, **_dlq_filters(request.args))
+    return Response(buf.getvalue(), mimetype="application/x-ndjson")
+
+
 # ---------------------- WORKER CONTROL ----------------------
 
 @app.route("/workers/start", methods=["POST"])
@@ -77,6 +130,123 @@ def stop_worker():
     return jsonify({"status": "stopping", "message": "Workers will stop after current job"}), 200
 
 
+# ---------------------- REMOTE WORKERS (lease / ack) ----------------------
+
+LEASE_POLL_INTERVAL = 0.5   # seconds between DB checks while long-polling
+LEASE_MAX_WAIT = 30         # cap on client-requested long-poll duration
+LEASE_MAX_BATCH = 100       # cap on jobs handed out per lease
+
+
+def _worker_payload():
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    worker = data.get("worker")
+    if not worker:
+        raise ValueError("Missing field: worker")
+    return worker, data
+
+
+def _job_ids(data):
+    job_ids = data.get("job_ids", [])
+    if not isinstance(job_ids, list) or not all(isinstance(j, str) for j in job_ids):
+        raise ValueError("'job_ids' must be a list of strings")
+    return job_ids
+
+
+def _failures(data):
+    jobs = data.get("jobs", [])
+    if not isinstance(jobs, list) or not all(
+        isinstance(f, dict) and isinstance(f.get("id"), str) and isinstance(f.get("usage") or {}, dict)
+        for f in jobs
+    ):
+        raise ValueError("'jobs' must be a list of objects with a string 'id'")
+    return jobs
+
+
+def _lease_seconds(data):
+    """Optional lease length, clamped to 1..LEASE_MAX_SECONDS so a lease is never expired on arrival."""
+    val = data.get("lease_seconds")
+    if val is None:
+        return None
+    if isinstance(val, bool) or not isinstance(val, (int, float, str)):
+        raise ValueError("'lease_seconds' must be an integer")
+    return min(max(1, int(val)), LEASE_MAX_SECONDS)
+
+
+@app.route("/lease", methods=["POST"])
+def lease():
+    """
+    Lease up to `limit` jobs; long-poll up to `wait` seconds if none are runnable.
+    The global stop flag only applies to local workers; remote workers stop via signals.
+    """
+    try:
+        worker, data = _worker_payload()
+        limit = min(max(1, int(data.get("limit", 1))), LEASE_MAX_BATCH)
+        wait = min(max(0.0, float(data.get("wait", 0))), LEASE_MAX_WAIT)
+        lease_seconds = _lease_seconds(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
+
+    deadline = time.monotonic() + wait
+    while True:
+        # lease_jobs only takes the write lock when something is actually runnable
+        jobs = lease_jobs(worker, limit, lease_seconds)
+        if jobs or time.monotonic() >= deadline:
+            break
+        time.sleep(min(LEASE_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+    # Fill in the server's default timeout so remote workers don't depend on their local config
+    default_timeout = int(get_config_value("job_timeout") or 10)
+    leased = [{**dict(j), "timeout": j["timeout"] or default_timeout} for j in jobs]
+    return jsonify({"status": "success", "jobs": leased}), 200
+
+
+@app.route("/ack", methods=["POST"])
+def ack():
+    try:
+        worker, data = _worker_payload()
+        usage = data.get("usage") or {}
+        if not isinstance(usage, dict) or not all(isinstance(u, dict) for u in usage.values()):
+            raise ValueError("'usage' must map job ids to objects")
+        acked = ack_jobs(worker, _job_ids(data), usage)
+        return jsonify({"status": "success", "acked": acked}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
+
+
+@app.route("/nack", methods=["POST"])
+def nack():
+    try:
+        worker, data = _worker_payload()
+        results = nack_jobs(worker, _failures(data))
+        return jsonify({"status": "success", "results": results}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
+
+
+@app.route("/release", methods=["POST"])
+def release():
+    """Return unstarted leased jobs to the queue without counting an attempt."""
+    try:
+        worker, data = _worker_payload()
+        released = release_jobs(worker, _job_ids(data))
+        return jsonify({"status": "success", "released": released}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
+
+
+@app.route("/heartbeat", methods=["POST"])
+def heartbeat():
+    try:
+        worker, data = _worker_payload()
+        extended = heartbeat_jobs(worker, _job_ids(data), _lease_seconds(data))
+        return jsonify({"status": "success", "extended": extended}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
+
+
 # ---------------------- CONFIGURATION ----------------------
 
 @app.route("/config", methods=["GET", "POST"])
@@ -125,8 +295,10 @@ def get_metrics():
         "pending_jobs": pending,
         "failed_jobs": failed,
         "success_rate": f"{success_rate}%",
-        "active_workers": int(get_config_value("stop") == "0")
+        "active_workers": int(get_config_value("stop") == "0"),
+        "resources": resource_summary(),
     }
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8080, debug=True)
+    # threaded=True so long-polling /lease calls don't block other requests
+    app.run(host="0.0.0.0", port=8080, debug=True, threaded=True)
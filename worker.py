@@ -1,15 +1,24 @@
 import os
+import resource
 import signal
+import socket
 import subprocess
+import sys
+import threading
 import time 
 from multiprocessing import Process
+from typing import Any, Dict, List, Optional, Set, Tuple
+from client import QueueClient
 from job_queue import (
-    claim_next_job, mark_completed, mark_retry,
-    move_to_dlq, get_config_value, set_config
+    claim_next_job, mark_completed, fail_job, record_usage,
+    get_config_value, set_config
 )
 from utils import log_info, log_warn, ensure_data_dir
 
 _SHOULD_STOP = False
+RSS_SAMPLE_INTERVAL = 0.1  # seconds between /proc peak-RSS samples of a running job
+RSS_FULL_SCAN_EVERY = 20   # without /proc/<pid>/task/*/children, scan all of /proc every 2s
+_PROC_CHILDREN = os.path.exists(f"/proc/{os.getpid()}/task/{os.getpid()}/children")
 
 
 def _sigint_handler(signum, frame):
@@ -24,13 +33,195 @@ def _should_global_stop() -> bool:
     return (get_config_value("stop") or "0") == "1" or _SHOULD_STOP
 
 
-def run_once():
-    """Pick one job and execute with timeout, retry, and logging."""
-    job = claim_next_job()
-    if not job:
-        time.sleep(0.5)  # Avoid busy loop
+def _job_value(job, key: str):
+    """Read an optional column from a sqlite3.Row or a leased-job dict."""
+    try:
+        return job[key]
+    except (IndexError, KeyError):
+        return None
+
+
+def _ulimit_prefix(job) -> str:
+    """
+    Shell prefix applying the job's rlimits to the job's shell (and so to
+    everything it runs). Done with `ulimit` rather than preexec_fn, which is
+    unsafe while other threads (e.g. the remote heartbeat) are running.
+    """
+    cpu = _job_value(job, "cpu_limit")
+    mem_mb = _job_value(job, "memory_limit_mb")
+    nofile = _job_value(job, "max_open_files")
+    cmds = []
+    if cpu:
+        # Soft limit sends SIGXCPU; hard limit one second later is SIGKILL
+        hard = _clamp_to_hard(resource.RLIMIT_CPU, int(cpu) + 1)
+        # Soft first: lowering the hard limit below the current soft one is EINVAL
+        cmds += [f"ulimit -S -t {min(int(cpu), hard)}", f"ulimit -H -t {hard}"]
+    if mem_mb:
+        kb = _clamp_to_hard(resource.RLIMIT_AS, int(mem_mb) * 1024 * 1024) // 1024
+        cmds.append(f"ulimit -v {kb}")
+    if nofile:
+        cmds.append(f"ulimit -n {_clamp_to_hard(resource.RLIMIT_NOFILE, int(nofile))}")
+    if not cmds:
+        return ""
+    # The job's own command goes on the next line so its syntax is left untouched
+    return " && ".join(cmds) + " || exit 125\n"
+
+
+def _clamp_to_hard(which, value: int) -> int:
+    """An unprivileged process can't raise a hard limit, so never ask for more than the current one."""
+    _, hard = resource.getrlimit(which)
+    return value if hard == resource.RLIM_INFINITY else min(value, hard)
+
+
+def _maxrss_kb(ru_maxrss: int) -> int:
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return ru_maxrss // 1024 if sys.platform == "darwin" else ru_maxrss
+
+
+def _proc_session(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the parenthesised comm: state ppid pgrp session ...
+            return int(f.read().rsplit(")", 1)[1].split()[3])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _proc_children(pid: int) -> List[int]:
+    kids: List[int] = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                kids.extend(int(c) for c in f.read().split())
+    except (OSError, ValueError):
+        pass
+    return kids
+
+
+def _sample_peak_rss(session: int, peak: Dict[str, int], finished: threading.Event):
+    """
+    Track the highest VmHWM of the job's processes (Linux /proc). VmHWM is
+    reset by exec, unlike rusage maxrss, which inherits the worker's own
+    high-water mark through fork/vfork + exec.
+
+    Only the job's own process tree is walked (via task/*/children). Kernels
+    without that file fall back to a full /proc scan, but only once every
+    RSS_FULL_SCAN_EVERY samples; in between, already-found pids are re-read.
+    """
+    if not os.path.isdir("/proc/self"):
         return
+    known = {session}
+    tick = 0
+    while True:
+        if _PROC_CHILDREN:
+            candidates, frontier = set(), list(known)
+            while frontier:
+                pid = frontier.pop()
+                if pid not in candidates:
+                    candidates.add(pid)
+                    frontier.extend(_proc_children(pid))
+        elif tick % RSS_FULL_SCAN_EVERY == 0:
+            candidates = known | {int(p) for p in os.listdir("/proc") if p.isdigit()}
+        else:
+            candidates = known
+        # Orphans reparented away from the shell stay tracked while they're in the session
+        known = {pid for pid in candidates if _proc_session(pid) == session}
+        for pid in known:
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmHWM:"):
+                            peak["kb"] = max(peak.get("kb", 0), int(line.split()[1]))
+                            break
+            except (OSError, IndexError, ValueError):
+                continue
+        tick += 1
+        if finished.wait(RSS_SAMPLE_INTERVAL):
+            return
+
+
+def _run_measured(cmd: str, timeout: int, job) -> Tuple[int, str, str, Dict[str, Any], bool]:
+    """
+    Run `cmd` in its own process group with the job's rlimits, killing the
+    group if it (including any backgrounded children still holding its
+    output pipes) outlives `timeout` seconds. The shell is reaped with
+    wait4() so its rusage can be captured. Returns (rc, stdout, stderr, usage, timed_out).
+    """
+    baseline_kb = _maxrss_kb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    started = time.monotonic()
+    deadline = started + timeout
+    proc = subprocess.Popen(
+        _ulimit_prefix(job) + cmd,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+    )
+    output = {}
+
+    def _drain(name, stream):
+        output[name] = stream.read()
+        stream.close()
+
+    readers = [
+        threading.Thread(target=_drain, args=("stdout", proc.stdout), daemon=True),
+        threading.Thread(target=_drain, args=("stderr", proc.stderr), daemon=True),
+    ]
+    for t in readers:
+        t.start()
+
+    peak: Dict[str, int] = {}
+    finished = threading.Event()
+    sampler = threading.Thread(target=_sample_peak_rss, args=(proc.pid, peak, finished), daemon=True)
+    sampler.start()
+
+    timed_out = threading.Event()
+
+    def _kill():
+        timed_out.set()
+        try:
+            # The group id stays valid (and unreused) while any member is alive
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    # The deadline stays armed until both pipes hit EOF, not just until the shell exits
+    timer = threading.Timer(timeout, _kill)
+    timer.start()
+    try:
+        _, status, ru = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        for t in readers:
+            t.join(max(0.0, deadline - time.monotonic()))
+        if any(t.is_alive() for t in readers):
+            _kill()
+            for t in readers:
+                t.join(1.0)
+    finally:
+        timer.cancel()
+        finished.set()
+    wall = time.monotonic() - started
+    sampler.join(1.0)
+
+    # rusage maxrss starts at the worker's own peak (inherited across exec), so it
+    # only tells us something when it exceeds that floor; otherwise use /proc sampling.
+    ru_kb = _maxrss_kb(ru.ru_maxrss)
+    usage = {
+        "wall_time": round(wall, 3),
+        "cpu_user": round(ru.ru_utime, 3),
+        "cpu_sys": round(ru.ru_stime, 3),
+        # None when nothing was measured (job finished before the first sample)
+        "max_rss_kb": max(peak.get("kb", 0), ru_kb if ru_kb > baseline_kb else 0) or None,
+    }
+    return proc.returncode, output.get("stdout", ""), output.get("stderr", ""), usage, timed_out.is_set()
+
 
+def _execute(job) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Execute a claimed job with its timeout, limits, and logging.
+    Returns (failure reason or None on success, measured usage or None).
+    """
     job_id = job["id"]
     cmd = job["command"]
     attempts = int(job["attempts"])
@@ -43,74 +234,76 @@ def run_once():
 
     log_info(f"[{job_id}] processing (attempt {attempts}/{max_retries}) -> `{cmd}`")
 
-    # ✅ Timeout in seconds (can later be made configurable)
-    timeout = 10
+    # ✅ Per-job timeout in seconds (falls back to config job_timeout)
+    timeout = int(_job_value(job, "timeout") or get_config_value("job_timeout") or 10)
 
     try:
-        # Execute the job command with timeout and output capture
-        completed = subprocess.run(
-            cmd,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=timeout
-        )
-        rc = completed.returncode
+        # Execute the job command with timeout, rlimits and output capture
+        rc, stdout, stderr, usage, timed_out = _run_measured(cmd, timeout, job)
 
         # ✅ Log output to file
         with open(log_path, "a") as f:
             f.write(f"=== Job {job_id} executed at {time.strftime('%Y-%m-%d %H:%M:%S')} ===\n")
             f.write(f"Command: {cmd}\n")
             f.write(f"Exit Code: {rc}\n")
+            f.write(f"Wall: {usage['wall_time']}s  User CPU: {usage['cpu_user']}s  "
+                    f"Sys CPU: {usage['cpu_sys']}s  Max RSS: {usage['max_rss_kb'] or 'n/a'} KB\n")
             f.write("----- STDOUT -----\n")
-            f.write(completed.stdout or "")
+            f.write(stdout or "")
             f.write("\n----- STDERR -----\n")
-            f.write(completed.stderr or "")
+            f.write(stderr or "")
             f.write("\n\n")
 
-        # ✅ Evaluate result
+        if timed_out:
+            # ✅ Handle timeout separately
+            log_warn(f"[{job_id}] timed out after {timeout}s")
+            return f"Timeout after {timeout}s", usage
         if rc == 0:
-            mark_completed(job_id)
-            log_info(f"[{job_id}] completed ✔")
-        else:
-            attempts += 1
-            if attempts > max_retries:
-                move_to_dlq(job_id, cmd, f"Exit code {rc}, retries exhausted")
-                log_warn(f"[{job_id}] moved to DLQ (rc={rc})")
-            else:
-                mark_retry(job_id, attempts)
-                log_warn(f"[{job_id}] failed (rc={rc}), scheduled retry with backoff")
-
-    except subprocess.TimeoutExpired:
-        # ✅ Handle timeout separately
-        log_warn(f"[{job_id}] timed out after {timeout}s")
-        attempts += 1
-        if attempts > max_retries:
-            move_to_dlq(job_id, cmd, f"Timeout after {timeout}s")
-            log_warn(f"[{job_id}] moved to DLQ (timeout)")
-        else:
-            mark_retry(job_id, attempts)
-            log_warn(f"[{job_id}] retrying after timeout with backoff")
+            return None, usage
+        # Killed by a signal, e.g. SIGXCPU/SIGKILL from the CPU limit
+        signals = {s.value for s in signal.Signals}
+        if rc < 0 and -rc in signals:
+            return f"Exit code {rc}, killed by {signal.Signals(-rc).name}", usage
+        if rc > 128 and rc - 128 in signals:
+            # The shell reports a signalled child as 128+N, but a plain `exit 137` looks the same
+            return f"Exit code {rc}, possibly {signal.Signals(rc - 128).name}", usage
+        return f"Exit code {rc}", usage
 
     except FileNotFoundError as e:
         # ✅ Command not found handling
-        attempts += 1
-        if attempts > max_retries:
-            move_to_dlq(job_id, cmd, f"Command not found: {e}")
-            log_warn(f"[{job_id}] moved to DLQ (command not found)")
-        else:
-            mark_retry(job_id, attempts)
-            log_warn(f"[{job_id}] command not found; scheduled retry with backoff")
+        return f"Command not found: {e}", None
 
     except Exception as e:
         # ✅ Generic error handling
-        attempts += 1
-        if attempts > max_retries:
-            move_to_dlq(job_id, cmd, f"Unhandled error: {e}")
-            log_warn(f"[{job_id}] moved to DLQ (error)")
-        else:
-            mark_retry(job_id, attempts)
-            log_warn(f"[{job_id}] error: {e}; scheduled retry with backoff")
+        return f"Unhandled error: {e}", None
+
+
+def _log_outcome(job_id: str, reason: Optional[str], outcome: Optional[str]):
+    if reason is None:
+        log_info(f"[{job_id}] completed ✔")
+    elif outcome == "dead":
+        log_warn(f"[{job_id}] moved to DLQ ({reason})")
+    elif outcome == "retry":
+        log_warn(f"[{job_id}] failed ({reason}), scheduled retry with backoff")
+    else:
+        log_warn(f"[{job_id}] failed ({reason}) but is no longer held by this worker")
+
+
+def run_once():
+    """Pick one job and execute with timeout, retry, and logging."""
+    job = claim_next_job()
+    if not job:
+        time.sleep(0.5)  # Avoid busy loop
+        return
+
+    job_id = job["id"]
+    reason, usage = _execute(job)
+    record_usage(job_id, usage)
+    if reason is None:
+        mark_completed(job_id)
+        _log_outcome(job_id, None, None)
+    else:
+        _log_outcome(job_id, reason, fail_job(job_id, reason))
 
 
 def run_worker_loop():
@@ -125,11 +318,107 @@ def run_worker_loop():
     log_warn(f"Worker PID {os.getpid()} exiting")
 
 
-def start_workers(count: int):
-    """Spawn multiple worker processes."""
+# ------------------ Remote Workers ------------------
+
+REMOTE_LEASE_WAIT = 20      # long-poll seconds per /lease call
+REMOTE_LEASE_SECONDS = 60   # lease length requested from the server; renewed by heartbeats
+REMOTE_IDLE_BACKOFF_MAX = 5  # max sleep after an early empty lease
+
+
+def _heartbeat_loop(url: str, worker: str, held: Set[str], lock: threading.Lock, done: threading.Event):
+    """Keep leases alive while jobs run; uses its own connection (clients aren't thread-safe)."""
+    client = QueueClient(url, worker)
+    while not done.wait(REMOTE_LEASE_SECONDS / 3):
+        with lock:
+            job_ids = list(held)
+        if not job_ids:
+            continue
+        try:
+            client.heartbeat(job_ids, REMOTE_LEASE_SECONDS)
+        except Exception as e:
+            log_warn(f"Heartbeat failed: {e}")
+    client.close()
+
+
+def _run_leased_batch(client: QueueClient, jobs, held: Set[str], lock: threading.Lock):
+    """
+    Run one lease's jobs, acking or nacking each as soon as it finishes so a
+    crash mid-batch doesn't turn finished jobs into expired leases. Jobs not
+    started because of a stop signal are released back to the queue without
+    counting an attempt.
+    """
+    for i, job in enumerate(jobs):
+        if _SHOULD_STOP:
+            unstarted = [j["id"] for j in jobs[i:]]
+            try:
+                client.release(unstarted)
+            except Exception as e:
+                log_warn(f"Could not release {len(unstarted)} unstarted job(s): {e}; leases will expire")
+            with lock:
+                held.difference_update(unstarted)
+            return
+        job_id = job["id"]
+        reason, usage = _execute(job)
+        try:
+            if reason is None:
+                client.ack([job_id], usage={job_id: usage} if usage else None)
+                _log_outcome(job_id, None, None)
+            else:
+                outcome = client.nack([{"id": job_id, "reason": reason, "usage": usage}]).get(job_id)
+                _log_outcome(job_id, reason, outcome)
+        except Exception as e:
+            log_warn(f"[{job_id}] could not report result: {e}; lease will expire")
+        with lock:
+            held.discard(job_id)
+
+
+def run_remote_worker_loop(url: str, batch: int = 1):
+    """Worker loop that leases jobs from a queuectl server over HTTP instead of the local DB."""
+    signal.signal(signal.SIGINT, _sigint_handler)
+    signal.signal(signal.SIGTERM, _sigint_handler)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    client = QueueClient(url, worker, timeout=REMOTE_LEASE_WAIT + 30)
+    held: Set[str] = set()
+    lock = threading.Lock()
+    done = threading.Event()
+    threading.Thread(
+        target=_heartbeat_loop, args=(url, worker, held, lock, done), daemon=True
+    ).start()
+    log_info(f"Remote worker {worker} started against {url}")
+
+    idle_backoff = 0.0
+    while not _SHOULD_STOP:
+        asked = time.monotonic()
+        try:
+            jobs = client.lease(batch, wait=REMOTE_LEASE_WAIT, lease_seconds=REMOTE_LEASE_SECONDS)
+        except Exception as e:
+            log_warn(f"Lease failed: {e}; retrying")
+            time.sleep(2)
+            continue
+        if not jobs:
+            # An empty lease that came back early means the server isn't long-polling; don't spin
+            if time.monotonic() - asked < REMOTE_LEASE_WAIT / 2:
+                idle_backoff = min(REMOTE_IDLE_BACKOFF_MAX, idle_backoff * 2 or 0.5)
+                time.sleep(idle_backoff)
+            continue
+        idle_backoff = 0.0
+        with lock:
+            held.update(j["id"] for j in jobs)
+        _run_leased_batch(client, jobs, held, lock)
+
+    done.set()
+    client.close()
+    log_warn(f"Remote worker {worker} exiting")
+
+
+def start_workers(count: int, remote: Optional[str] = None, batch: int = 1):
+    """Spawn multiple worker processes (local DB, or leasing from a remote server)."""
     procs = []
     for _ in range(count):
-        p = Process(target=run_worker_loop)
+        if remote:
+            p = Process(target=run_remote_worker_loop, args=(remote, batch))
+        else:
+            p = Process(target=run_worker_loop)
         p.start()
         procs.append(p)
 